@@ -4,89 +4,279 @@ FlashDash – CSV Visualizer — multi‑file
 
 • Upload one or many CSVs  → instant preview per file.
 • Paste Python that uses:
-      • df_all     → concatenation of every upload, with column __source__
+      • df_all     → concatenation of every upload, with categorical column __source__
       • df_<stem>  → individual dataframe per file (filename stem becomes variable name)
+      • njit / prange → numba JIT helpers for numeric loops (when numba is installed)
 • Click ▶️ Run code  → snippet executes on the server in a minimal sandbox.
 • If the snippet sets a variable named `fig`, an interactive HTML download button appears.
 """
 # Requires Google OAuth secrets in .streamlit/secrets.toml
 # (see README for the expected [auth] block)
 
-import base64
+import ast
 from pathlib import Path
 import textwrap
 import io
 import builtins  # for automatic safe built‑ins
 import math
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import plotly.io as pio
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs_version
 import streamlit as st
 import altair as alt
 from streamlit_ace import st_ace  # requires: pip install streamlit-ace
 
-import boto3, json, zipfile, datetime, os, io, uuid
+import boto3, json, zipfile, datetime, os, io, uuid, tempfile, hashlib
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
 
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+try:
+    import polars as pl  # optional CSV backend, see CSV_BACKEND
+except ImportError:
+    pl = None
+
+try:
+    import numba  # optional JIT exposed to user snippets
+except ImportError:
+    numba = None
+
+try:
+    import python_calamine  # noqa: F401 – Rust Excel reader behind pandas' "calamine"
+
+    _EXCEL_ENGINE = "calamine"
+except ImportError:
+    _EXCEL_ENGINE = None  # let pandas pick openpyxl / xlrd
+
 # ── Sandbox safety helpers ──────────────────────────────────────
-DANGEROUS_MODULES = {
-    "os",
-    "sys",
-    "subprocess",
-    "socket",
-    "shutil",
-    "pathlib",
-    "importlib",
-    "inspect",
-    "builtins",
-    "pkg_resources",
-}
+DANGEROUS_MODULES = frozenset(
+    {
+        "os",
+        "sys",
+        "subprocess",
+        "socket",
+        "shutil",
+        "pathlib",
+        "importlib",
+        "inspect",
+        "builtins",
+        "pkg_resources",
+    }
+)
+
+# (name, fromlist) → module; the _safe_builtins resource keeps the first
+# run's safe_import, so this stays warm across reruns and sessions
+_import_cache: dict[tuple, object] = {}
 
 
 def safe_import(name, globals=None, locals=None, fromlist=(), level=0):
     """Custom __import__ that blocks risky top‑level modules inside user snippet."""
-    base = name.split(".")[0]
+    base = name.partition(".")[0]
     if base in DANGEROUS_MODULES:
         raise ImportError(f"Import of '{base}' is blocked in this sandbox.")
-    return __import__(name, globals, locals, fromlist, level)
+    if level:  # relative import – resolved against *globals*, don't memoise
+        return __import__(name, globals, locals, fromlist, level)
+    key = (name, tuple(fromlist or ()))
+    mod = _import_cache.get(key)
+    if mod is None:
+        mod = _import_cache[key] = __import__(name, globals, locals, fromlist, level)
+    return mod
+
+
+_BLOCKED_BUILTINS = frozenset(
+    {
+        "open",
+        "compile",
+        "eval",
+        "exec",
+        "input",
+        "exit",
+        "quit",
+        "help",
+        "breakpoint",
+        "importlib",  # explicit module blocked
+    }
+)
+
+
+@st.cache_resource
+def _safe_builtins() -> dict:
+    """
+    Every harmless builtin plus the guarded __import__.
+    Built once per server process – the script body itself re‑runs on every
+    interaction, so a plain module‑level dict would be rebuilt each time.
+    """
+    safe = {
+        name: getattr(builtins, name)
+        for name in dir(builtins)
+        if name not in _BLOCKED_BUILTINS and not name.startswith("_")
+    }
+    safe["__import__"] = safe_import  # guarded import
+    return safe
 
 
 # Helper to build combined dataframe
 def build_df_all(data_map: dict[str, pd.DataFrame]) -> pd.DataFrame | None:
-    """Return a concatenated dataframe with __source__ column or None."""
-    if data_map:
-        return pd.concat(
-            [df.assign(__source__=name) for name, df in data_map.items()],
-            ignore_index=True,
+    """
+    Return a concatenated dataframe with __source__ column or None.
+    May share blocks with *data_map*'s frames – hand out copies (_df_all_cached).
+    """
+    if not data_map:
+        return None
+    # Shallow copies + a categorical __source__ (int codes, one shared category
+    # list so concat keeps it categorical) instead of a copied object column.
+    names = list(data_map)
+    frames = []
+    for code, (name, df) in enumerate(data_map.items()):
+        part = df.copy(deep=False)
+        part["__source__"] = pd.Categorical.from_codes(
+            np.full(len(part), code, dtype=np.int32), categories=names
         )
-    return None
+        frames.append(part)
+    if len(frames) == 1:
+        # one upload: nothing to stack – just match concat's fresh RangeIndex
+        part = frames[0]
+        part.index = pd.RangeIndex(len(part))
+        return part
+    return pd.concat(frames, ignore_index=True, copy=False)
+
+
+def _df_all_cached(data_map: dict[str, pd.DataFrame]) -> pd.DataFrame | None:
+    """
+    build_df_all memoised in session_state across reruns.
+    • Reused while *data_map* holds the very same frame objects (identity check,
+      no hashing of the data itself).
+    • Returns a deep copy: the memo shares blocks with the uploads, and a
+      snippet's in‑place edits (df_all["v"] *= 2, fillna(inplace=True), …)
+      must reach neither. Still skips the concat and the __source__ build.
+    """
+    items = tuple(data_map.items())
+    cached = st.session_state.get("_df_all_cache")
+    if not (
+        cached is not None
+        and len(cached[0]) == len(items)
+        and all(n1 == n2 and d1 is d2 for (n1, d1), (n2, d2) in zip(cached[0], items))
+    ):
+        # keep *items* referenced so their ids can't be recycled while cached
+        cached = (items, build_df_all(data_map))
+        st.session_state["_df_all_cache"] = cached
+    df_all = cached[1]
+    return None if df_all is None else df_all.copy()
+
+
+# Names that let a snippet reach any sandbox variable without naming it
+_DYNAMIC_LOOKUPS = frozenset({"globals", "locals", "vars"})
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def _compile_snippet(src: str):
+    """
+    Return (code object, names referenced by *src*).
+    Shared across sessions – both are immutable, so each distinct snippet is
+    parsed and compiled once per process. Names is None when the snippet looks
+    variables up dynamically.
+    """
+    tree = ast.parse(src, "<snippet>")
+    names = frozenset(n.id for n in ast.walk(tree) if isinstance(n, ast.Name))
+    if names & _DYNAMIC_LOOKUPS:
+        names = None
+    return compile(tree, "<snippet>", "exec"), names
 
 
 # ── Utility helpers ────────────────────────────────────────────────────────────
 import zipfile
 
 _EXCEL_EXT = (".xlsx", ".xlsm", ".xls")
+_EXCEL_MAGIC = (
+    b"PK\x03\x04",  # .xlsx/.xlsm are ZIP archives
+    b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",  # .xls is an OLE2 compound file
+)
 
+# "pyarrow" (default) or "polars" – the latter only takes effect if installed
+CSV_BACKEND = os.getenv("CSV_BACKEND", "pyarrow")
 
-def read_tabular(uploaded_file):
+
+def _parse_csv(data: bytes) -> pd.DataFrame:
+    """Parse raw CSV bytes with the configured backend."""
+    if CSV_BACKEND == "polars" and pl is not None:
+        try:
+            return pl.read_csv(data).to_pandas()
+        except pl.exceptions.PolarsError:
+            pass  # schema inference tripped → let pandas have a go
+    try:
+        # multithreaded Arrow reader; much faster than the C engine on big files
+        df = pd.read_csv(io.BytesIO(data), engine="pyarrow")
+        if _arrow_csv_ok(df):
+            return _dates_as_text(df)
+    except (ImportError, ValueError):
+        pass  # pyarrow missing or the file uses something its reader rejects
+    # C engine: low_memory=False infers each column's dtype from the whole file
+    return pd.read_csv(io.BytesIO(data), low_memory=False)
+
+
+def _arrow_csv_ok(df: pd.DataFrame) -> bool:
     """
-    Return a DataFrame from a Streamlit UploadedFile that might be CSV **or** Excel.
-    • Tries Excel first when the extension suggests it.
+    False where the pyarrow result can't be patched up to match the C engine:
+    • duplicate headers stay duplicated (C engine mangles them to a, a.1, …)
+    • non‑UTF‑8 text comes back as bytes (C engine raises UnicodeDecodeError)
+    Date‑only columns are fixed afterwards by _dates_as_text.
+    """
+    if not df.columns.is_unique:
+        return False
+    for col in df.select_dtypes("object"):
+        first = df[col].first_valid_index()
+        if first is not None and isinstance(df[col].at[first], bytes):
+            return False
+    return True
+
+
+def _dates_as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Arrow reads ISO date‑only columns (CSV or Parquet date32) as objects of
+    datetime.date – Altair can't serialise those and .str rejects them. Turn
+    them back into the "YYYY-MM-DD" strings the C engine gives (in place).
+    """
+    for col in df.select_dtypes("object"):
+        s = df[col]
+        first = s.first_valid_index()
+        if first is None:
+            continue
+        value = s.at[first]
+        if isinstance(value, datetime.date) and not isinstance(
+            value, datetime.datetime
+        ):
+            df[col] = s.map(datetime.date.isoformat, na_action="ignore")
+    return df
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _parse_bytes(name: str, data: bytes) -> pd.DataFrame:
+    """
+    Parse a file's raw bytes → DataFrame, once per distinct (name, bytes).
+    • Tries Excel first when the extension suggests it and the magic bytes agree;
+      anything else (e.g. a CSV renamed .xlsx) goes straight to the CSV parser.
     • Falls back to CSV if Excel parsing fails for any reason.
     """
-    name = uploaded_file.name.lower()
-    is_excel = name.endswith(_EXCEL_EXT)
-    if is_excel:
+    if name.lower().endswith(_EXCEL_EXT) and data.startswith(_EXCEL_MAGIC):
         try:
-            return pd.read_excel(uploaded_file, sheet_name=0)  # pandas chooses engine
+            return pd.read_excel(io.BytesIO(data), sheet_name=0, engine=_EXCEL_ENGINE)
         except (ValueError, ImportError, OSError, zipfile.BadZipFile):
             pass  # couldn’t parse as Excel → try CSV
+    return _parse_csv(data)
 
-    uploaded_file.seek(0)  # rewind buffer in case read_excel consumed it
-    return pd.read_csv(uploaded_file)
+
+def read_tabular(uploaded_file):
+    """
+    Return a DataFrame from a Streamlit UploadedFile that might be CSV **or** Excel.
+    Reads the buffer once and hands it to the cached parser, so reruns are free.
+    """
+    return _parse_bytes(uploaded_file.name, uploaded_file.getvalue())
 
 
 def ingest_uploads(files, store):
@@ -107,7 +297,33 @@ def ingest_uploads(files, store):
 AWS_REGION = os.getenv("AWS_REGION", "us-east-2")
 S3_BUCKET = os.getenv("VIZ_BUCKET", "csv-visualizer-sunderdev")
 
-s3 = boto3.client("s3", region_name=AWS_REGION)
+# parallel S3 requests per call; the client pool below leaves room for
+# a couple of sessions fanning out at once
+S3_MAX_CONCURRENCY = 32
+
+
+@st.cache_resource(show_spinner=False)  # runs before set_page_config
+def _s3_client():
+    """One shared, thread‑safe client per process (not one per rerun)."""
+    return boto3.client(
+        "s3",
+        region_name=AWS_REGION,
+        config=Config(
+            max_pool_connections=64,
+            retries={"mode": "adaptive", "max_attempts": 5},
+            tcp_keepalive=True,
+        ),
+    )
+
+
+s3 = _s3_client()
+# ZIPs past 5 MB go up/down as parallel multipart ranges
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=5 << 20,
+    multipart_chunksize=5 << 20,
+    max_concurrency=8,
+    use_threads=True,
+)
 
 # ── Navigation state helper ───────────────────────────────────────────────
 if "page" not in st.session_state:
@@ -186,31 +402,94 @@ Click **🔄 Reset workspace** (top‑left of the page) any time you want to c
 **Prompt template for your AI assistant**
 
 > *“Write Streamlit‑ready Python that assumes a dataframe named **df_all** is already loaded in memory. Build an interactive Plotly (or Altair) figure, then display it with `st.plotly_chart(fig, use_container_width=True)`. Use only pandas, numpy, plotly, or altair, and do not include Dash or any file‑I/O or network code.”*
+
+**Tip – Fast numeric loops**  
+`njit` and `prange` (numba) are pre‑loaded. Decorate a loop over NumPy arrays, e.g.
+`@njit(parallel=True)` on `def total(a): ...` using `for i in prange(a.size)`, and call it with `df_all["col"].to_numpy()`.
 """
     )
 
 
 # ── S3 HELPERS ────────────────────────────────────────────────────────────
-def _zip_project(author: str, name: str, snippet: str, data_map: dict) -> bytes:
+PST = ZoneInfo("America/Los_Angeles")  # saved_at / expires_at are Pacific dates
+# data/<upload name>.parquet inside project ZIPs (plain data/<upload name> = CSV)
+_PARQUET_EXT = ".parquet"
+
+
+def _parquet_bytes(df: pd.DataFrame) -> bytes | None:
+    """
+    Parquet (Snappy) encoding of *df*, or None when Arrow can't write it
+    (non‑string column names, mixed‑type object columns, …).
+    """
     buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+    try:
+        df.to_parquet(buf, engine="pyarrow", compression="snappy", index=False)
+    except (ValueError, TypeError, NotImplementedError, ImportError):
+        return None
+    return buf.getvalue()
+
+
+_SPOOL_MAX = 32 << 20  # project ZIPs stay in RAM up to this size, then hit disk
+
+
+def _zip_project(
+    snippet: str, data_map: dict, meta: dict
+) -> tempfile.SpooledTemporaryFile:
+    """Build the project ZIP into a rewound spooled file (caller closes it)."""
+    # Arrow encodes/compresses outside the GIL, so frames serialise side by side
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(data_map)))) as pool:
+        payloads = list(pool.map(_parquet_bytes, data_map.values()))
+    buf = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX)
+    # level 1: several times faster than the default 6 for ~10 % larger CSVs
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
         z.writestr("snippet.py", snippet)
-        meta = {
-            "author": author,
-            "name": name,
-            "saved_at": datetime.datetime.now(ZoneInfo("America/Los_Angeles")).strftime(
-                "%B %d, %Y"
-            ),  # PST/PDT
-            "expires_at": (
-                datetime.datetime.now(ZoneInfo("America/Los_Angeles"))
-                + datetime.timedelta(days=90)
-            ).strftime("%Y-%m-%d"),
-        }
         z.writestr("meta.json", json.dumps(meta))
-        for fname, df in data_map.items():
-            z.writestr(f"data/{fname}", df.to_csv(index=False))
+        for (fname, df), payload in zip(data_map.items(), payloads):
+            if payload is not None:
+                # already Snappy‑compressed → store as‑is
+                arcname = f"data/{fname}{_PARQUET_EXT}"
+                z.writestr(arcname, payload, compress_type=zipfile.ZIP_STORED)
+            else:
+                # stream CSV into the deflated member instead of building a str
+                with z.open(f"data/{fname}", "w", force_zip64=True) as member:
+                    df.to_csv(member, index=False)
     buf.seek(0)
-    return buf.read()
+    return buf
+
+
+def _ns_datetimes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    *df* with datetime/timedelta columns at ns resolution (shallow copy).
+    A Parquet round trip can change the unit (pyarrow‑parsed [s] loads as [ms]),
+    which would otherwise change both the dtype string and the hashed values.
+    """
+    cols = df.select_dtypes(["datetime", "datetimetz", "timedelta"]).columns
+    if not len(cols) or not df.columns.is_unique:
+        return df
+    df = df.copy(deep=False)
+    for col in cols:
+        df[col] = df[col].dt.as_unit("ns")
+    return df
+
+
+def _content_digest(author: str, name: str, snippet: str, data_map: dict) -> str | None:
+    """
+    SHA‑256 over everything that goes into a project ZIP (minus timestamps).
+    Frames are hashed column‑wise by pandas, never serialised; returns None when
+    a frame holds values pandas can't hash, so callers just upload as usual.
+    """
+    h = hashlib.sha256()
+    for part in (author, name, snippet):
+        h.update(part.encode() + b"\0")
+    try:
+        for fname, df in data_map.items():
+            h.update(fname.encode() + b"\0")
+            df = _ns_datetimes(df)
+            h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+            h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    except (TypeError, pd.errors.OutOfBoundsDatetime):
+        return None
+    return h.hexdigest()
 
 
 def save_project_s3(author: str, name: str, snippet: str, data_map: dict) -> None:
@@ -220,28 +499,31 @@ def save_project_s3(author: str, name: str, snippet: str, data_map: dict) -> Non
     zip_key = f"projects/{project_id}.zip"
     meta_key = f"index/{project_id}.json"
 
-    body = _zip_project(author, name, snippet, data_map)
-    # 1️⃣ upload ZIP
-    s3.put_object(Bucket=S3_BUCKET, Key=zip_key, Body=body)
-
-    # 2️⃣ upload small meta
+    now = datetime.datetime.now(PST)
+    expires = now.date() + datetime.timedelta(days=90)
     meta = {
         "author": author,
         "name": name,
-        "saved_at": datetime.datetime.now(ZoneInfo("America/Los_Angeles")).strftime(
-            "%B %d, %Y"
-        ),
-        "expires_at": (
-            datetime.datetime.now(ZoneInfo("America/Los_Angeles"))
-            + datetime.timedelta(days=90)
-        ).strftime("%Y-%m-%d"),
+        "saved_at": now.strftime("%B %d, %Y"),  # PST/PDT
+        "saved_at_iso": now.strftime("%Y-%m-%d"),  # sorts as a plain string
+        "expires_at": expires.strftime("%Y-%m-%d"),
+        "expires_ordinal": expires.toordinal(),  # badge math without parsing
+        "content_sha256": _content_digest(author, name, snippet, data_map),
     }
+
+    # 1️⃣ upload ZIP
+    with _zip_project(snippet, data_map, meta) as body:
+        s3.upload_fileobj(body, S3_BUCKET, zip_key, Config=S3_TRANSFER_CONFIG)
+
+    # 2️⃣ upload small meta (+ its manifest entry)
     s3.put_object(
         Bucket=S3_BUCKET,
         Key=meta_key,
         Body=json.dumps(meta).encode(),
         ContentType="application/json",
     )
+    _update_manifest(project_id, meta)
+    list_projects_s3.clear()
 
 
 # --- Update existing project helper ---
@@ -250,50 +532,78 @@ def update_project_s3(
 ):
     """
     Overwrite an existing project ZIP + meta (keep its current expires_at).
+    The ZIP upload is skipped when its content digest is unchanged.
     """
     zip_key = f"projects/{project_id}.zip"
     meta_key = f"index/{project_id}.json"
 
-    # Preserve existing expires_at (incl. `"never"`)
-    meta_obj = s3.get_object(Bucket=S3_BUCKET, Key=meta_key)
-    meta = json.loads(meta_obj["Body"].read())
-    expires = meta.get("expires_at", "")
-
-    body = _zip_project(author, name, snippet, data_map)
-    s3.put_object(Bucket=S3_BUCKET, Key=zip_key, Body=body)
-
-    meta.update(
-        {
-            "author": author,
-            "name": name,
-            "saved_at": datetime.datetime.now(ZoneInfo("America/Los_Angeles")).strftime(
-                "%B %d, %Y"
-            ),
-            "expires_at": expires,  # unchanged
-        }
-    )
-    s3.put_object(
-        Bucket=S3_BUCKET,
-        Key=meta_key,
-        Body=json.dumps(meta).encode(),
-        ContentType="application/json",
-    )
+    digest = _content_digest(author, name, snippet, data_map)
+    zip_written = False
+    # Read‑modify‑write under the index JSON's ETag (as set_project_expiration
+    # does), so an expiry toggle landing in between isn't silently reverted
+    for _ in range(_MANIFEST_RETRIES):
+        # Preserve existing expires_at (incl. `"never"`)
+        meta_obj = s3.get_object(Bucket=S3_BUCKET, Key=meta_key)
+        meta = json.loads(meta_obj["Body"].read())
+        unchanged = digest is not None and digest == meta.get("content_sha256")
+
+        now = datetime.datetime.now(PST)
+        meta.update(
+            {
+                "author": author,
+                "name": name,
+                "saved_at": now.strftime("%B %d, %Y"),
+                "saved_at_iso": now.strftime("%Y-%m-%d"),
+                "expires_at": meta.get("expires_at", ""),  # unchanged
+                "content_sha256": digest,
+            }
+        )
+        if not (unchanged or zip_written):
+            with _zip_project(snippet, data_map, meta) as body:
+                s3.upload_fileobj(body, S3_BUCKET, zip_key, Config=S3_TRANSFER_CONFIG)
+            load_snippet_only.clear()
+            zip_written = True
+
+        try:
+            s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=meta_key,
+                Body=json.dumps(meta).encode(),
+                ContentType="application/json",
+                IfMatch=meta_obj["ETag"],
+            )
+            break
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in _CONDITIONAL_WRITE_CONFLICTS:
+                raise
+    else:
+        raise RuntimeError("Project is being changed elsewhere – please try again.")
+    _update_manifest(project_id, meta)
+    list_projects_s3.clear()
 
 
 # ── Expiry badge helper ──────────────────────────────────────────────────────────
-def expiry_badge(expires_at_str: str) -> str:
+def expiry_badge(
+    expires_at_str: str,
+    expires_ordinal: int | None = None,
+    today_ordinal: int | None = None,
+) -> str:
     """
     Returns emoji badge and text like '🟢 3 mo', '🔴 1 wk', or
     '∞ no expiration' when expiry is disabled.
+    Pass the meta's expires_ordinal (and today's ordinal, once per render) to
+    skip date parsing; older metas without it fall back to the ISO string.
     """
     if expires_at_str in ("", "never", None):
         return "∞ no expiration"
-    try:
-        expires = datetime.datetime.strptime(expires_at_str, "%Y-%m-%d").date()
-    except Exception:
-        return ""
-    today = datetime.date.today()
-    delta = (expires - today).days
+    if expires_ordinal is None:
+        try:
+            expires_ordinal = datetime.date.fromisoformat(expires_at_str).toordinal()
+        except (TypeError, ValueError):
+            return ""
+    if today_ordinal is None:
+        today_ordinal = datetime.date.today().toordinal()
+    delta = expires_ordinal - today_ordinal
 
     if delta < 0:
         return "❌ expired"
@@ -310,55 +620,534 @@ def expiry_badge(expires_at_str: str) -> str:
     return "🔴 1 mo"
 
 
-def set_project_expiration(project_id: str, expires_at: str | None):
+def set_project_expiration(project_id: str, expires_at: str | None) -> None:
     """
-    Overwrite the project's meta index JSON with a new expires_at value.
+    Patch only the expiry fields of the project's meta index JSON.
     Pass expires_at='never' to disable expiry, or an ISO date string to re‑enable.
+    Always re‑reads the index JSON (the cached listing may be stale) and writes
+    it back under that read's ETag, retrying if another writer got in between.
     """
     meta_key = f"index/{project_id}.json"
-    meta_obj = s3.get_object(Bucket=S3_BUCKET, Key=meta_key)
-    meta = json.loads(meta_obj["Body"].read())
-    meta["expires_at"] = expires_at
-    s3.put_object(
+    for _ in range(_MANIFEST_RETRIES):
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=meta_key)
+        meta = json.loads(obj["Body"].read())
+        meta["expires_at"] = expires_at
+        meta["saved_at_iso"] = _saved_at_iso(meta)  # backfills legacy records
+        if expires_at in ("never", None):
+            meta.pop("expires_ordinal", None)
+        else:
+            expires = datetime.date.fromisoformat(expires_at)
+            meta["expires_ordinal"] = expires.toordinal()
+        try:
+            s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=meta_key,
+                Body=json.dumps(meta).encode(),
+                ContentType="application/json",
+                IfMatch=obj["ETag"],
+            )
+            break
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in _CONDITIONAL_WRITE_CONFLICTS:
+                raise
+    else:
+        raise RuntimeError("Project is being changed elsewhere – please try again.")
+    _update_manifest(project_id, meta)
+    list_projects_s3.clear()
+
+
+def delete_project_s3(project_id: str) -> None:
+    """Remove a project's ZIP, its index JSON and its manifest entry."""
+    # ZIP + index JSON in one round-trip
+    resp = s3.delete_objects(
         Bucket=S3_BUCKET,
-        Key=meta_key,
-        Body=json.dumps(meta).encode(),
-        ContentType="application/json",
+        Delete={
+            "Objects": [
+                {"Key": f"projects/{project_id}.zip"},
+                {"Key": f"index/{project_id}.json"},
+            ],
+            "Quiet": True,
+        },
     )
+    if resp.get("Errors"):
+        # batch deletes report per-key failures instead of raising
+        raise RuntimeError(f"S3 delete failed: {resp['Errors']}")
+    _update_manifest(project_id, None)
+    list_projects_s3.clear()
+
+
+# ── Project manifest ─────────────────────────────────────────────────────────
+# index/<id>.json stays the per‑project source of truth; the manifest mirrors
+# all of them in one object ({project_id: meta}) so listing is a single GET.
+MANIFEST_KEY = "index/manifest.json"
+_MANIFEST_RETRIES = 5
+_CONDITIONAL_WRITE_CONFLICTS = ("PreconditionFailed", "ConditionalRequestConflict")
+
+
+def _scan_index() -> dict:
+    """project_id → meta, read from every index/<id>.json (manifest excluded)."""
+    paginator = s3.get_paginator("list_objects_v2")
+    meta_keys = [
+        obj["Key"]
+        for page in paginator.paginate(Bucket=S3_BUCKET, Prefix="index/")
+        for obj in page.get("Contents", [])
+        if obj["Key"] != MANIFEST_KEY
+    ]
+
+    def _fetch(meta_key):
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=meta_key)
+        return json.loads(obj["Body"].read())
+
+    # one GET per project – fan them out instead of paying N round-trips serially
+    with ThreadPoolExecutor(max_workers=S3_MAX_CONCURRENCY) as pool:
+        metas = list(pool.map(_fetch, meta_keys))
+    return {Path(k).stem: meta for k, meta in zip(meta_keys, metas)}
+
+
+def rebuild_manifest(force: bool = False) -> dict:
+    """
+    Re‑create the manifest from every index/<id>.json and return it.
+    • Default (runs when no manifest exists): only *creates* it (IfNoneMatch);
+      if another writer got there first, its copy is read back instead.
+    • force=True repairs drift – a write that died between its index JSON and
+      its manifest entry – by replacing the manifest under IfMatch of the ETag
+      read *before* the scan, so an entry added meanwhile triggers a rescan
+      rather than being lost.
+    """
+    for _ in range(_MANIFEST_RETRIES):
+        guard = {"IfNoneMatch": "*"}
+        if force:
+            try:
+                head = s3.head_object(Bucket=S3_BUCKET, Key=MANIFEST_KEY)
+                guard = {"IfMatch": head["ETag"]}
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                    raise
+        manifest = _scan_index()
+        try:
+            s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=MANIFEST_KEY,
+                Body=json.dumps(manifest).encode(),
+                ContentType="application/json",
+                **guard,
+            )
+            return manifest
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in _CONDITIONAL_WRITE_CONFLICTS:
+                raise
+            if not force:
+                # lost the race – the winner's copy may already hold newer entries
+                obj = s3.get_object(Bucket=S3_BUCKET, Key=MANIFEST_KEY)
+                return json.loads(obj["Body"].read())
+    raise RuntimeError("Project manifest is busy – please try again.")
+
+
+def _update_manifest(project_id: str, meta: dict | None) -> None:
+    """
+    Set (or, with meta=None, drop) one manifest entry.
+    Read‑modify‑write guarded by the manifest's ETag: a concurrent writer
+    makes the PUT fail with 412 and we retry on the fresh copy.
+    """
+    for _ in range(_MANIFEST_RETRIES):
+        try:
+            obj = s3.get_object(Bucket=S3_BUCKET, Key=MANIFEST_KEY)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            # index JSON is already written, so a fresh rebuild includes this
+            # change; if another rebuild won the race, loop and apply it on top
+            rebuild_manifest()
+            continue
+        manifest = json.loads(obj["Body"].read())
+        if meta is None:
+            manifest.pop(project_id, None)
+        else:
+            manifest[project_id] = meta
+        try:
+            s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=MANIFEST_KEY,
+                Body=json.dumps(manifest).encode(),
+                ContentType="application/json",
+                IfMatch=obj["ETag"],
+            )
+            return
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in _CONDITIONAL_WRITE_CONFLICTS:
+                raise
+    # still contended: the index JSON is already written (or deleted), so a
+    # forced rebuild reconciles the manifest instead of leaving it drifted
+    rebuild_manifest(force=True)
+
+
+def _saved_at_iso(meta: dict) -> str:
+    """meta's saved_at as YYYY-MM-DD; records older than saved_at_iso get parsed."""
+    if "saved_at_iso" in meta:
+        return meta["saved_at_iso"]
+    saved = datetime.datetime.strptime(meta["saved_at"], "%B %d, %Y")
+    return saved.strftime("%Y-%m-%d")
+
 
+_WIDGET_KEY_TABLE = str.maketrans("/.-", "___")
 
+
+@st.cache_data(ttl=60, show_spinner=False)
 def list_projects_s3() -> list[dict]:
     """
-    Return list of {key, author, name, saved_at} using meta index objects.
+    Return list of {key, id, safe_id, author, name, saved_at} from the project
+    manifest. Cached for 60 s; every write path calls list_projects_s3.clear().
     """
-    paginator = s3.get_paginator("list_objects_v2")
+    try:
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=MANIFEST_KEY)
+        manifest = json.loads(obj["Body"].read())
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        manifest = rebuild_manifest()
+
     projects = []
-    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix="index/"):
-        for obj in page.get("Contents", []):
-            meta = json.loads(
-                s3.get_object(Bucket=S3_BUCKET, Key=obj["Key"])["Body"].read()
-            )
-            meta["author"] = meta.get("author", "").strip()
-            meta["name"] = meta.get("name", "").strip()
-            project_id = Path(obj["Key"]).stem
-            zip_key = f"projects/{project_id}.zip"
-            projects.append({"key": zip_key, **meta})
-    return sorted(projects, key=lambda x: x["saved_at"], reverse=True)
+    for project_id, meta in manifest.items():
+        meta["author"] = meta.get("author", "").strip()
+        meta["name"] = meta.get("name", "").strip()
+        meta["saved_at_iso"] = _saved_at_iso(meta)
+        zip_key = f"projects/{project_id}.zip"
+        projects.append(
+            {
+                "key": zip_key,
+                "id": project_id,
+                "safe_id": zip_key.translate(_WIDGET_KEY_TABLE),  # widget‑key safe
+                **meta,
+            }
+        )
+    return sorted(projects, key=lambda x: x["saved_at_iso"], reverse=True)
+
+
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def load_snippet_only(key: str) -> str:
+    """
+    Return just snippet.py of the project at *key* – the data members are never
+    decompressed. Cached for 60 s like the listing (other replicas' updates show
+    up within that); update_project_s3 clears it here when it rewrites a ZIP.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX) as spool:
+        s3.download_fileobj(S3_BUCKET, key, spool, Config=S3_TRANSFER_CONFIG)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as z:
+            return z.read("snippet.py").decode()
 
 
 def load_project_s3(key: str) -> tuple[str, dict]:
     """Return (snippet, data_map) for project stored at *key*."""
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    with zipfile.ZipFile(io.BytesIO(obj["Body"].read())) as z:
-        snippet = z.read("snippet.py").decode()
-        data_map = {
-            name[len("data/") :]: pd.read_csv(z.open(name))
-            for name in z.namelist()
-            if name.startswith("data/")
-        }
+    # download_fileobj fetches large objects as concurrent ranged GETs; the spool
+    # stays in RAM for small projects and spills to disk past 32 MB
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX) as spool:
+        s3.download_fileobj(S3_BUCKET, key, spool, Config=S3_TRANSFER_CONFIG)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as z:
+            snippet = z.read("snippet.py").decode()
+            members = [
+                (name[len("data/") :], z.read(name))
+                for name in z.namelist()
+                if name.startswith("data/")
+            ]
+    # Arrow and pandas' CSV parser release the GIL, so files parse side by side
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(members)))) as pool:
+        data_map = dict(pool.map(lambda m: _read_member(*m), members))
     return snippet, data_map
 
 
+def _read_member(arcname: str, data: bytes) -> tuple[str, pd.DataFrame]:
+    """Decode one data/ member → (original upload name, DataFrame)."""
+    if arcname.endswith(_PARQUET_EXT):
+        df = _dates_as_text(pd.read_parquet(io.BytesIO(data)))
+        return arcname[: -len(_PARQUET_EXT)], df
+    return arcname, _parse_bytes(arcname, data)  # CSV (legacy/fallback)
+
+
+# ── Workspace sections ────────────────────────────────────────────────────
+def _figure_html(fig: go.Figure) -> bytes:
+    """
+    Standalone HTML page for *fig*: its JSON plus plotly.js from the CDN – what
+    pio.to_html(include_plotlyjs="cdn") produces, without the templating pass.
+    """
+    cdn = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+    fig_json = fig.to_json().replace("</", "<\\/")  # can't close the <script>
+    return (
+        '<!doctype html><html><head><meta charset="utf-8">'
+        f'<script src="{cdn}"></script></head><body>'
+        '<div id="fig" style="width:100%;height:100vh"></div>'
+        f'<script>Plotly.newPlot("fig", {fig_json});</script>'
+        "</body></html>"
+    ).encode()
+
+
+def _show_previews(data_map: dict) -> None:
+    """Head of every loaded dataframe."""
+    st.markdown("#### 📄 File previews")
+    for name, df_tmp in data_map.items():
+        st.success(f"Preview of **{name}**:")
+        st.dataframe(df_tmp.head())
+
+
+def _run_snippet(code_to_run: str, data_map: dict) -> None:
+    """
+    Execute the saved snippet against *data_map* and render its output.
+    Deliberately not a fragment: snippets may put widgets in st.sidebar, which
+    fragments reject on the Streamlit versions requirements.txt allows.
+    """
+    try:
+        code_obj, used = _compile_snippet(code_to_run)
+    except SyntaxError as e:
+        code_obj, used = None, None
+        st.exception(e)
+
+    def _wanted(var: str) -> bool:
+        """Only materialise sandbox variables the snippet actually names."""
+        return used is None or var in used
+
+    sandbox = {
+        # shallow copy so one snippet can't tamper with another's builtins
+        "__builtins__": dict(_safe_builtins()),
+        "st": st,
+        "pd": pd,
+        "px": px,
+        "alt": alt,
+        "dfs": data_map,
+    }
+    if numba is not None:
+        sandbox.update(numba=numba, njit=numba.njit, prange=numba.prange)
+
+    # Combined dataframe – the one expensive variable, skipped when unused
+    if _wanted("df_all"):
+        sandbox["df_all"] = _df_all_cached(data_map)
+
+    # Per‑file variables
+    for name, df in data_map.items():
+        stem = Path(name).stem.replace("-", "_").replace(" ", "_")
+        if _wanted(f"df_{stem}"):
+            sandbox[f"df_{stem}"] = df
+
+    # Hint logic
+    if len(data_map) == 1:
+        single_name, single_df = next(iter(data_map.items()))
+        sandbox["df"] = single_df
+        sandbox["__hint__"] = (
+            f"Single file uploaded → use df or dfs['{single_name}'] "
+            "(plus df_<stem> alias)."
+        )
+    else:
+        sandbox["__hint__"] = (
+            "Multiple files uploaded → use df_all (file name in the "
+            "categorical __source__ column), dfs['<filename>'], "
+            "or per‑file variables df_<stem>."
+        )
+
+    # Execute
+    if code_obj is not None:
+        try:
+            exec(code_obj, sandbox)
+        except Exception as e:
+            st.exception(e)
+
+    # Show variables hint
+    st.info(sandbox["__hint__"])
+
+    # Download Plotly figure if present
+    if isinstance(sandbox.get("fig"), go.Figure):
+        st.download_button(
+            "💾 Save interactive HTML",
+            _figure_html(sandbox["fig"]),
+            file_name="figure.html",
+            mime="text/html",
+        )
+
+
+@st.fragment
+def _save_panel() -> None:
+    """
+    Save / update controls for the current snippet + data. A fragment, so
+    opening the form or saving reruns only this panel – not the snippet.
+    """
+    st.markdown("### ✅ Save this result")
+    # Inline success banner shown right where the user clicked “Save”
+    if st.session_state.get("save_success"):
+        st.success(st.session_state.pop("save_success"))
+
+    project_id = st.session_state.get("current_project_id")
+
+    # Two buttons when editing an existing project; otherwise just "Save as new"
+    if project_id:
+        col_new, col_update, _ = st.columns([0.12, 0.12, 0.50])
+        if col_new.button("💾 Save as New"):
+            st.session_state["show_save_form"] = True
+            st.session_state["saving_mode"] = "new"
+            st.rerun(scope="fragment")
+        if col_update.button("⟲ Update this Project"):
+            update_project_s3(
+                project_id,
+                st.session_state.get("current_project_author", "Unknown").strip(),
+                st.session_state.get("current_project_name", "").strip(),
+                st.session_state["snippet"],
+                st.session_state["data_map"],
+            )
+            st.success("✅ Project updated!")
+    else:
+        if st.button("💾 Save to Projects"):
+            st.session_state["show_save_form"] = True
+            st.session_state["saving_mode"] = "new"
+            st.rerun(scope="fragment")
+
+    if st.session_state.get("show_save_form"):
+        with st.form("save_project_form", clear_on_submit=False):
+            st.info(
+                "Tip: choose a descriptive title like “Q2 Regional Sales – CA” so you and your peers can recognize it later."
+            )
+            author_ws = st.text_input("Your name", key="author_ws")
+            proj_ws = st.text_input("Project name", key="proj_ws")
+            submitted = st.form_submit_button("Save")
+            if submitted:
+                if not (author_ws and proj_ws):
+                    st.warning("Please fill in both fields.")
+                else:
+                    save_project_s3(
+                        author_ws.strip(),
+                        proj_ws.strip(),
+                        st.session_state["snippet"],
+                        st.session_state["data_map"],
+                    )
+                    # Persist success message so it shows *after* the rerun
+                    st.session_state["save_success"] = "✅ New project saved!"
+                    # Reset form flags
+                    for k in ["show_save_form", "saving_mode"]:
+                        st.session_state.pop(k, None)
+                    st.rerun(scope="fragment")
+
+
+# ── Projects fragments ────────────────────────────────────────────────────
+@st.fragment
+def _projects_panel() -> None:
+    """
+    Filters + project list. A fragment: filter changes, expiry toggles and
+    deletes rerun only this panel; loading a project reruns the whole app.
+    """
+    st.subheader("🗂️ Your saved projects")
+    if st.button(
+        "🔧 Rescan projects",
+        help="Rebuild the list from storage if a saved project is missing "
+        "or a deleted one still shows up",
+        key="rebuild_manifest",
+    ):
+        rebuild_manifest(force=True)
+        list_projects_s3.clear()
+    projects = list_projects_s3()
+    # ── Filters ─────────────────────────────────────────────────────
+    proj_names = sorted({p["name"] for p in projects})
+    selected_name = st.selectbox(
+        "Filter by project name", ["(All)"] + proj_names, index=0
+    )
+
+    # Author filter
+    authors = sorted({p["author"] for p in projects})
+    selected_author = st.selectbox("Filter by author", ["(All)"] + authors, index=0)
+
+    sort_order = st.radio(
+        "Sort by date", ["Newest first", "Oldest first"], horizontal=True, index=0
+    )
+
+    # Apply name filter
+    if selected_name != "(All)":
+        projects = [p for p in projects if p["name"] == selected_name]
+
+    # Apply author filter
+    if selected_author != "(All)":
+        projects = [p for p in projects if p["author"] == selected_author]
+
+    # Apply sort order
+    projects = sorted(
+        projects,
+        key=lambda x: x["saved_at_iso"],
+        reverse=(sort_order == "Newest first"),
+    )
+    if not projects:
+        st.info("No projects saved yet.")
+    else:
+        today_ordinal = datetime.date.today().toordinal()
+        for p in projects:
+            col1, col_exp, col_perm, col_load, col_del = st.columns([3, 2, 1, 1, 1])
+            badge = expiry_badge(
+                p.get("expires_at", ""), p.get("expires_ordinal"), today_ordinal
+            )
+            col1.write(f"{p['author']} — **{p['name']}**  \n*saved {p['saved_at']}*")
+            safe_id = p["safe_id"]
+            # Peek at the code without pulling the project's data into the session
+            if col1.toggle("Show code", key=f"code_{safe_id}"):
+                col1.code(load_snippet_only(p["key"]), language="python")
+
+            col_exp.write(f"Expiration: {badge}")
+
+            # Toggle expiration
+            perm_key = f"perm_{safe_id}"
+            if p.get("expires_at") == "never":
+                if col_perm.button("🔓 Enable", key=perm_key):
+                    new_date = (
+                        datetime.date.today() + datetime.timedelta(days=90)
+                    ).strftime("%Y-%m-%d")
+                    set_project_expiration(p["id"], new_date)
+                    st.rerun(scope="fragment")
+            else:
+                if col_perm.button("🔒 No expiry", key=perm_key):
+                    set_project_expiration(p["id"], "never")
+                    st.rerun(scope="fragment")
+
+            if col_load.button("Load", key=f"load_{safe_id}"):
+                snippet, data_map = load_project_s3(p["key"])
+                st.session_state["data_map"] = data_map
+                # Track loaded project id
+                st.session_state["current_project_id"] = p["id"]
+                st.session_state["current_project_author"] = p["author"]
+                st.session_state["current_project_name"] = p["name"]
+                # Project loads should not be treated as “uploader active”
+                st.session_state["uploader_active"] = False
+                st.session_state["snippet"] = snippet
+                st.session_state["snippet_ready"] = True  # NEW
+                st.session_state["goto_workspace"] = True  # request navigation
+                # Force widgets to reset with new content
+                st.session_state["uploader_key"] = (
+                    st.session_state.get("uploader_key", 0) + 1
+                )
+                st.session_state["editor_key"] = (
+                    st.session_state.get("editor_key", 0) + 1
+                )
+                # Overwrite any previous ID
+                st.rerun()  # whole app: navigates to the Workspace
+
+            confirm_key = f"confirm_{safe_id}"  # separate from button key
+            del_btn_key = f"del_{safe_id}"
+
+            if confirm_key not in st.session_state:
+                st.session_state[confirm_key] = False
+
+            if not st.session_state[confirm_key]:
+                if col_del.button("🗑️", key=del_btn_key):
+                    st.session_state[confirm_key] = True
+                    st.rerun(scope="fragment")
+            else:
+                with col_del:
+                    st.warning("Confirm?", icon="⚠️")
+                    c1, c2 = st.columns(2)
+                    if c1.button("Yes", key=f"yes_{del_btn_key}"):
+                        project_id = p["id"]
+                        delete_project_s3(project_id)
+                        if st.session_state.get("current_project_id") == project_id:
+                            st.session_state.pop("current_project_id", None)
+                        st.session_state.pop(confirm_key, None)
+                        st.rerun(scope="fragment")
+                    if c2.button("No", key=f"no_{del_btn_key}"):
+                        st.session_state[confirm_key] = False
+                        st.rerun(scope="fragment")
+
+
 # ── Sidebar navigation ──────────────────────────────────────────────────────
 
 page = st.sidebar.radio("Navigate:", ["Workspace", "Projects"], key="page")
@@ -381,6 +1170,7 @@ if page == "Workspace":
     ):
         for k in [
             "data_map",
+            "_df_all_cache",
             "snippet",
             "show_save_form",
             "ace_editor",
@@ -436,15 +1226,9 @@ if page == "Workspace":
         if removed:
             st.rerun()
 
-    # Build/refresh combined dataframe
-    df_all = build_df_all(st.session_state["data_map"])
-
     # ── Show previews regardless of how data_map was populated (upload or project load)
     if st.session_state["data_map"]:
-        st.markdown("#### 📄 File previews")
-        for name, df_tmp in st.session_state["data_map"].items():
-            st.success(f"Preview of **{name}**:")
-            st.dataframe(df_tmp.head())
+        _show_previews(st.session_state["data_map"])
 
     # --- Safe import wrapper (uses global safe_import) -----------------------------
     # (Already defined at module level)
@@ -477,240 +1261,13 @@ if page == "Workspace":
 
     # ── Execute the saved snippet on every rerun (if present) ────────────────────
     if "snippet" in st.session_state and st.session_state["data_map"]:
-        code_to_run = st.session_state["snippet"]
-
-        # Auto‑expose every harmless builtin; block only dangerous ones
-        safe_builtins = {
-            name: getattr(builtins, name)
-            for name in dir(builtins)
-            if name
-            not in {
-                "open",
-                "compile",
-                "eval",
-                "exec",
-                "input",
-                "exit",
-                "quit",
-                "help",
-                "breakpoint",
-                "importlib",  # explicit module blocked
-            }
-            and not name.startswith("_")
-        }
-        safe_builtins["__import__"] = safe_import  # guarded import
-
-        sandbox = {
-            "__builtins__": safe_builtins,
-            "st": st,
-            "pd": pd,
-            "px": px,
-            "alt": alt,
-            "df_all": df_all,
-            "dfs": st.session_state["data_map"],
-        }
-
-        # Per‑file variables
-        for name, df in st.session_state["data_map"].items():
-            stem = Path(name).stem.replace("-", "_").replace(" ", "_")
-            sandbox[f"df_{stem}"] = df
-
-        # Hint logic
-        if len(st.session_state["data_map"]) == 1:
-            single_name, single_df = next(iter(st.session_state["data_map"].items()))
-            sandbox["df"] = single_df
-            sandbox["__hint__"] = (
-                f"Single file uploaded → use df or dfs['{single_name}'] "
-                "(plus df_<stem> alias)."
-            )
-        else:
-            sandbox["__hint__"] = (
-                "Multiple files uploaded → use df_all, dfs['<filename>'], "
-                "or per‑file variables df_<stem>."
-            )
-
-        # Execute
-        try:
-            exec(code_to_run, sandbox)
-        except Exception as e:
-            st.exception(e)
-
-        # Show variables hint
-        st.info(sandbox["__hint__"])
-
-        # Download Plotly figure if present
-        if "fig" in sandbox:
-            html = pio.to_html(sandbox["fig"], include_plotlyjs="cdn")
-            b64 = base64.b64encode(html.encode()).decode()
-            st.download_button(
-                "💾 Save interactive HTML",
-                b64,
-                file_name="figure.html",
-                mime="text/html",
-            )
+        _run_snippet(st.session_state["snippet"], st.session_state["data_map"])
 
         # ── Save to Projects (S3) ───────────────────────────────────────
-        st.markdown("### ✅ Save this result")
-        # Inline success banner shown right where the user clicked “Save”
-        if st.session_state.get("save_success"):
-            st.success(st.session_state.pop("save_success"))
-
-        project_id = st.session_state.get("current_project_id")
-
-        # Two buttons when editing an existing project; otherwise just "Save as new"
-        if project_id:
-            col_new, col_update, _ = st.columns([0.12, 0.12, 0.50])
-            if col_new.button("💾 Save as New"):
-                st.session_state["show_save_form"] = True
-                st.session_state["saving_mode"] = "new"
-                st.rerun()
-            if col_update.button("⟲ Update this Project"):
-                update_project_s3(
-                    project_id,
-                    st.session_state.get("current_project_author", "Unknown").strip(),
-                    st.session_state.get("current_project_name", "").strip(),
-                    st.session_state["snippet"],
-                    st.session_state["data_map"],
-                )
-                st.success("✅ Project updated!")
-        else:
-            if st.button("💾 Save to Projects"):
-                st.session_state["show_save_form"] = True
-                st.session_state["saving_mode"] = "new"
-                st.rerun()
-
-        if st.session_state.get("show_save_form"):
-            with st.form("save_project_form", clear_on_submit=False):
-                st.info(
-                    "Tip: choose a descriptive title like “Q2 Regional Sales – CA” so you and your peers can recognize it later."
-                )
-                author_ws = st.text_input("Your name", key="author_ws")
-                proj_ws = st.text_input("Project name", key="proj_ws")
-                submitted = st.form_submit_button("Save")
-                if submitted:
-                    if not (author_ws and proj_ws):
-                        st.warning("Please fill in both fields.")
-                    else:
-                        save_project_s3(
-                            author_ws.strip(),
-                            proj_ws.strip(),
-                            st.session_state["snippet"],
-                            st.session_state["data_map"],
-                        )
-                        # Persist success message so it shows *after* the rerun
-                        st.session_state["save_success"] = "✅ New project saved!"
-                        # Reset form flags
-                        for k in ["show_save_form", "saving_mode"]:
-                            st.session_state.pop(k, None)
-                        st.rerun()
+        _save_panel()
 
 # ── Projects page (S3-backed) ───────────────────────────────────────────────
 elif page == "Projects":
     st.header("📂 Saved Projects")
 
-    st.subheader("🗂️ Your saved projects")
-    projects = list_projects_s3()
-    # ── Filters ─────────────────────────────────────────────────────
-    proj_names = sorted({p["name"] for p in projects})
-    selected_name = st.selectbox(
-        "Filter by project name", ["(All)"] + proj_names, index=0
-    )
-
-    # Author filter
-    authors = sorted({p["author"] for p in projects})
-    selected_author = st.selectbox("Filter by author", ["(All)"] + authors, index=0)
-
-    sort_order = st.radio(
-        "Sort by date", ["Newest first", "Oldest first"], horizontal=True, index=0
-    )
-
-    # Apply name filter
-    if selected_name != "(All)":
-        projects = [p for p in projects if p["name"] == selected_name]
-
-    # Apply author filter
-    if selected_author != "(All)":
-        projects = [p for p in projects if p["author"] == selected_author]
-
-    # Apply sort order
-    projects = sorted(
-        projects,
-        key=lambda x: datetime.datetime.strptime(x["saved_at"], "%B %d, %Y"),
-        reverse=(sort_order == "Newest first"),
-    )
-    if not projects:
-        st.info("No projects saved yet.")
-    else:
-        for p in projects:
-            col1, col_exp, col_perm, col_load, col_del = st.columns([3, 2, 1, 1, 1])
-            badge = expiry_badge(p.get("expires_at", ""))
-            col1.write(f"{p['author']} — **{p['name']}**  \n*saved {p['saved_at']}*")
-
-            col_exp.write(f"Expiration: {badge}")
-
-            # Toggle expiration
-            safe_id = p["key"].replace("/", "_").replace(".", "_").replace("-", "_")
-            perm_key = f"perm_{safe_id}"
-            if p.get("expires_at") == "never":
-                if col_perm.button("🔓 Enable", key=perm_key):
-                    new_date = (
-                        datetime.date.today() + datetime.timedelta(days=90)
-                    ).strftime("%Y-%m-%d")
-                    set_project_expiration(Path(p["key"]).stem, new_date)
-                    st.rerun()
-            else:
-                if col_perm.button("🔒 No expiry", key=perm_key):
-                    set_project_expiration(Path(p["key"]).stem, "never")
-                    st.rerun()
-
-            if col_load.button("Load", key=f"load_{safe_id}"):
-                snippet, data_map = load_project_s3(p["key"])
-                st.session_state["data_map"] = data_map
-                # Track loaded project id
-                st.session_state["current_project_id"] = Path(p["key"]).stem
-                st.session_state["current_project_author"] = p["author"]
-                st.session_state["current_project_name"] = p["name"]
-                # Project loads should not be treated as “uploader active”
-                st.session_state["uploader_active"] = False
-                st.session_state["snippet"] = snippet
-                st.session_state["snippet_ready"] = True  # NEW
-                st.session_state["goto_workspace"] = True  # request navigation
-                # Force widgets to reset with new content
-                st.session_state["uploader_key"] = (
-                    st.session_state.get("uploader_key", 0) + 1
-                )
-                st.session_state["editor_key"] = (
-                    st.session_state.get("editor_key", 0) + 1
-                )
-                # Overwrite any previous ID
-                st.rerun()
-
-            confirm_key = f"confirm_{safe_id}"  # separate from button key
-            del_btn_key = f"del_{safe_id}"
-
-            if confirm_key not in st.session_state:
-                st.session_state[confirm_key] = False
-
-            if not st.session_state[confirm_key]:
-                if col_del.button("🗑️", key=del_btn_key):
-                    st.session_state[confirm_key] = True
-                    st.rerun()
-            else:
-                with col_del:
-                    st.warning("Confirm?", icon="⚠️")
-                    c1, c2 = st.columns(2)
-                    if c1.button("Yes", key=f"yes_{del_btn_key}"):
-                        project_id = Path(p["key"]).stem
-                        s3.delete_object(
-                            Bucket=S3_BUCKET, Key=f"projects/{project_id}.zip"
-                        )
-                        s3.delete_object(
-                            Bucket=S3_BUCKET, Key=f"index/{project_id}.json"
-                        )
-                        if st.session_state.get("current_project_id") == project_id:
-                            st.session_state.pop("current_project_id", None)
-                        st.session_state.pop(confirm_key, None)
-                        st.rerun()
-                    if c2.button("No", key=f"no_{del_btn_key}"):
-                        st.session_state[confirm_key] = False
-                        st.rerun()
+    _projects_panel()